@@ -28,6 +28,11 @@ const nextInvoiceNumberDisplay = document.getElementById('next-invoice-number');
 const processedCountDisplay = document.getElementById('processed-count');
 const autoExtractToggle = document.getElementById('auto-extract-toggle');
 const excludeDiscountToggle = document.getElementById('exclude-discount-toggle');
+const statsToday = document.getElementById('stats-today');
+const statsFailureRate = document.getElementById('stats-failure-rate');
+const statsAvgTime = document.getElementById('stats-avg-time');
+const statsP95Time = document.getElementById('stats-p95-time');
+const statsHourly = document.getElementById('stats-hourly');
 
 // Initialize
 document.addEventListener('DOMContentLoaded', () => {
@@ -35,6 +40,7 @@ document.addEventListener('DOMContentLoaded', () => {
     fetchNextInvoiceNumber();
     setupEventListeners();
     loadProcessedCount();
+    fetchStats();
 });
 
 // Set today's date as default
@@ -363,9 +369,71 @@ async function processInvoice() {
     } finally {
         spinner.classList.remove('active');
         processBtn.disabled = false;
+        fetchStats();
     }
 }
 
+// Fetch throughput stats from server (for the dashboard panel)
+async function fetchStats() {
+    try {
+        const response = await fetch(`${API_BASE_URL}/stats?hours=24&days=30`);
+        const data = await response.json();
+
+        if (data.success && data.enabled) {
+            renderStats(data.stats);
+        }
+    } catch (error) {
+        console.error('Error fetching stats:', error);
+    }
+}
+
+// Render throughput stats panel
+function renderStats(stats) {
+    const lastDay = stats.lastHours;
+
+    statsToday.textContent = stats.today.total;
+    statsFailureRate.textContent = lastDay.total ? `${(lastDay.failureRate * 100).toFixed(1)}%` : '-';
+    statsAvgTime.textContent = formatDuration(lastDay.avgMs);
+    statsP95Time.textContent = lastDay.p95Ms ? `≤ ${formatDuration(lastDay.p95Ms)}` : '-';
+
+    // One bar per hour for the last 24 hours, including empty hours
+    const byStart = new Map(stats.hourly.map(bucket => [bucket.start, bucket]));
+    const hours = [];
+    for (let i = 23; i >= 0; i--) {
+        const start = stats.currentHourStart - i * 3600;
+        hours.push({ start, bucket: byStart.get(start) });
+    }
+
+    const maxTotal = Math.max(1, ...hours.map(hour => (hour.bucket ? hour.bucket.total : 0)));
+    statsHourly.innerHTML = '';
+    hours.forEach(({ start, bucket }) => {
+        const total = bucket ? bucket.total : 0;
+        const failures = bucket ? bucket.failures : 0;
+        const label = new Date(start * 1000).getHours().toString().padStart(2, '0') + ':00';
+
+        const bar = document.createElement('div');
+        bar.className = 'hourly-bar';
+        bar.style.height = `${(total / maxTotal) * 100}%`;
+        bar.title = `${label} - ${total} processed, ${failures} failed` +
+            (bucket && bucket.avgMs !== null ? `, avg ${formatDuration(bucket.avgMs)}` : '');
+
+        if (failures > 0) {
+            const failed = document.createElement('div');
+            failed.className = 'hourly-bar-failed';
+            failed.style.height = `${(failures / total) * 100}%`;
+            bar.appendChild(failed);
+        }
+
+        statsHourly.appendChild(bar);
+    });
+}
+
+// Format milliseconds for display
+function formatDuration(ms) {
+    if (ms === null || ms === undefined) return '-';
+    return ms < 1000 ? `${Math.round(ms)} ms` : `${(ms / 1000).toFixed(1)} s`;
+}
+
 // Download processed PDF
 async function downloadProcessedPDF() {
     if (!processedFilename) {
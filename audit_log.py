@@ -0,0 +1,314 @@
+"""
+Append-only audit log for the Invoice PDF Processor
+
+Every invoice number allocation, processing result, download and failure is
+written as one JSON line. Records are buffered and written in batches with a
+single append, and the fsync policy decides how durable each batch is:
+
+    'always' - flush and fsync on every record (slowest, nothing lost)
+    'batch'  - fsync once per batch (default)
+    'never'  - leave it to the OS (fastest; a crash may lose the last batches)
+
+When the active file reaches its size limit it is rotated into a timestamped
+segment, and a summary of the segment (record count, time range, last
+allocation per sequence) is added to the index. Replay uses the index, so it
+only reads the active file (and any segment a crash kept out of the index) in
+full, even after old segments have been deleted. Replay never moves a sequence
+backwards.
+
+Usage:
+    python audit_log.py replay [--write]   # Rebuild sequence state (optionally save it)
+    python audit_log.py reindex            # Rebuild the index from the segment files
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import config
+from file_lock import FileLock
+from invoice_sequences import create_sequence_store, DEFAULT_SEQUENCE
+
+FSYNC_POLICIES = ('always', 'batch', 'never')
+
+
+class AuditLog:
+    """Batched JSON-lines audit log, safe to share between gunicorn workers"""
+
+    def __init__(self, path, index_path, batch_size=64, flush_interval=1.0, fsync_policy='batch',
+                 max_bytes=50 * 1024 * 1024, retain_segments=20, flush_events=('allocation',)):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+        self.path = path
+        self.index_path = index_path
+        self.lock_path = path + '.lock'
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.max_bytes = max_bytes
+        self.retain_segments = retain_segments
+        self.flush_events = set(flush_events)
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+        self._flusher = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        atexit.register(self.close)
+
+    def record(self, event, **fields):
+        """
+        Append an audit record.
+
+        Args:
+            event: Record type ('allocation', 'process', 'download', 'failure', ...)
+            **fields: JSON-serialisable details (timings in *_ms fields)
+        """
+        entry = {'ts': datetime.now().isoformat(), 'pid': os.getpid(), 'event': event}
+        entry.update(fields)
+        line = json.dumps(entry, separators=(',', ':'), default=str) + '\n'
+
+        with self._lock:
+            self._ensure_process_state()
+            self._buffer.append(line)
+            if (self.fsync_policy == 'always' or event in self.flush_events
+                    or len(self._buffer) >= self.batch_size):
+                self._flush_locked()
+
+    def flush(self):
+        """Write out any buffered records"""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """Flush and close the log file"""
+        with self._lock:
+            if self._pid == os.getpid():
+                self._flush_locked()
+                if self._fd is not None:
+                    os.close(self._fd)
+            self._fd = None
+
+    def _ensure_process_state(self):
+        """Reset file handles and start the flusher thread after a fork"""
+        if self._pid == os.getpid():
+            return
+        # Anything buffered belongs to the parent process
+        self._buffer = []
+        self._fd = None
+        self._pid = os.getpid()
+        if self.fsync_policy != 'always' and self.flush_interval:
+            self._flusher = threading.Thread(target=self._flush_periodically, name='audit-flusher', daemon=True)
+            self._flusher.start()
+
+    def _flush_periodically(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Audit log flush failed: {e}")
+
+    def _open(self):
+        """(Re)open the active file, following rotations done by other processes"""
+        try:
+            current_inode = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            current_inode = None
+        if self._fd is not None and current_inode == os.fstat(self._fd).st_ino:
+            return
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        data = ''.join(self._buffer).encode('utf-8')
+        self._buffer = []
+
+        with FileLock(self.lock_path):
+            self._open()
+            os.write(self._fd, data)
+            if self.fsync_policy != 'never':
+                os.fsync(self._fd)
+            if self.max_bytes and os.fstat(self._fd).st_size >= self.max_bytes:
+                self._rotate()
+
+    def _rotate(self):
+        """Move the active file to a segment and index it (caller holds the file lock)"""
+        os.close(self._fd)
+        self._fd = None
+        base, ext = os.path.splitext(self.path)
+        segment_path = f"{base}-{datetime.now().strftime('%Y%m%dT%H%M%S%f')}{ext}"
+        os.replace(self.path, segment_path)
+
+        index = load_index(self.index_path)
+        index['segments'].append(summarise_segment(segment_path))
+
+        # Delete the oldest segment files; their summaries stay in the index
+        live = [segment for segment in index['segments'] if not segment.get('deleted')]
+        for segment in live[:max(len(live) - self.retain_segments, 0)]:
+            try:
+                os.remove(os.path.join(os.path.dirname(self.path), segment['file']))
+            except FileNotFoundError:
+                pass
+            segment['deleted'] = True
+
+        save_index(self.index_path, index)
+        print(f"Rotated audit log to {segment_path}")
+
+
+def read_records(path):
+    """Yield records from a JSON-lines file, skipping a torn final line after a crash"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def apply_record(state, record):
+    """Fold one record into replay state ({sequence: last allocated number})"""
+    if record.get('event') == 'allocation':
+        sequence = record.get('sequence', DEFAULT_SEQUENCE)
+        number = record['invoice_number']
+        state[sequence] = max(state.get(sequence, number), number)
+
+
+def summarise_segment(segment_path):
+    """Build the index entry for a rotated segment"""
+    allocations = {}
+    records = 0
+    first_ts = last_ts = None
+    for record in read_records(segment_path):
+        records += 1
+        first_ts = first_ts or record.get('ts')
+        last_ts = record.get('ts')
+        apply_record(allocations, record)
+    return {
+        'file': os.path.basename(segment_path),
+        'records': records,
+        'first_ts': first_ts,
+        'last_ts': last_ts,
+        'allocations': allocations
+    }
+
+
+def load_index(index_path):
+    if os.path.exists(index_path):
+        with open(index_path, 'r') as f:
+            return json.load(f)
+    return {'segments': []}
+
+
+def save_index(index_path, index):
+    temp_path = index_path + '.tmp'
+    with open(temp_path, 'w') as f:
+        json.dump(index, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, index_path)
+
+
+def segment_files(log_path):
+    """Rotated segment file names on disk for a log, oldest first"""
+    directory = os.path.dirname(log_path) or '.'
+    base, ext = os.path.splitext(os.path.basename(log_path))
+    return sorted(
+        name for name in os.listdir(directory)
+        if name.startswith(base + '-') and name.endswith(ext)
+    )
+
+
+def rebuild_index(log_path, index_path):
+    """Rebuild the index from the segment files on disk (deleted segments are lost)"""
+    directory = os.path.dirname(log_path) or '.'
+    index = {'segments': [summarise_segment(os.path.join(directory, name)) for name in segment_files(log_path)]}
+    save_index(index_path, index)
+    return index
+
+
+def replay(log_path, index_path):
+    """
+    Rebuild the last allocated invoice number per sequence.
+
+    Segment summaries come from the index. Segment files on disk that the
+    index doesn't list (a crash between rotating and saving the index) are
+    read in full, then the active file.
+
+    Returns:
+        dict: {sequence: last_invoice_number}
+    """
+    state = {}
+    segments = load_index(index_path)['segments']
+    for segment in segments:
+        for sequence, number in segment.get('allocations', {}).items():
+            apply_record(state, {'event': 'allocation', 'sequence': sequence, 'invoice_number': number})
+    indexed = {segment['file'] for segment in segments}
+    directory = os.path.dirname(log_path) or '.'
+    for name in segment_files(log_path):
+        if name not in indexed:
+            for record in read_records(os.path.join(directory, name)):
+                apply_record(state, record)
+    for record in read_records(log_path):
+        apply_record(state, record)
+    return state
+
+
+def create_audit_log():
+    """Build the application audit log from config"""
+    if not config.AUDIT_LOG_ENABLED:
+        return None
+    return AuditLog(
+        config.AUDIT_LOG_FILE,
+        config.AUDIT_INDEX_FILE,
+        batch_size=config.AUDIT_BATCH_SIZE,
+        flush_interval=config.AUDIT_FLUSH_INTERVAL,
+        fsync_policy=config.AUDIT_FSYNC_POLICY,
+        max_bytes=config.AUDIT_MAX_BYTES,
+        retain_segments=config.AUDIT_RETAIN_SEGMENTS
+    )
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'replay'
+
+    if command == 'reindex':
+        index = rebuild_index(config.AUDIT_LOG_FILE, config.AUDIT_INDEX_FILE)
+        print(f"Indexed {len(index['segments'])} segments")
+        return 0
+
+    if command == 'replay':
+        state = replay(config.AUDIT_LOG_FILE, config.AUDIT_INDEX_FILE)
+        if not state:
+            print("No allocations found in the audit log")
+            return 1
+        for sequence, number in sorted(state.items()):
+            print(f"{sequence}: last_invoice_number = {number}")
+        if '--write' in argv:
+            store = create_sequence_store()
+            for sequence, number in sorted(state.items()):
+                if sequence not in store.names():
+                    print(f"Skipping {sequence}: not configured in INVOICE_SEQUENCES")
+                    continue
+                restored = store.restore(sequence, number)
+                if restored == number:
+                    print(f"Restored sequence {sequence} to {number}")
+                else:
+                    print(f"Kept sequence {sequence} at {restored} (ahead of the log)")
+        return 0
+
+    print(__doc__)
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
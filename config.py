@@ -1,6 +1,14 @@
 # Starting invoice number
 STARTING_INVOICE_NUMBER = 380812351
 
+# Named invoice number sequences (one per business entity), chosen with the
+# `sequence` request parameter. 'default' is stored in INVOICE_TRACKER_FILE;
+# others in SEQUENCES_FOLDER/<name>.json. Format uses {number}, e.g. 'AC-{number:06d}'
+INVOICE_SEQUENCES = {
+    'default': {'start': STARTING_INVOICE_NUMBER, 'format': '{number}'},
+}
+SEQUENCES_FOLDER = 'sequences'
+
 # Directories
 UPLOAD_FOLDER = 'uploads'
 OUTPUT_FOLDER = 'output'
@@ -43,6 +51,50 @@ FONT_NAME = 'Helvetica'
 FONT_SIZE = 10
 FONT_SIZE_LARGE = 12
 
+# Large-document mode: PDFs with at least this many pages are processed page
+# by page with incremental saves, under a per-job memory budget
+LARGE_DOCUMENT_PAGE_THRESHOLD = 50
+LARGE_DOCUMENT_CHECK_INTERVAL = 10  # Pages between memory checks
+LARGE_DOCUMENT_CHUNK_PAGES = 100  # Pages per incremental save (bounds memory held by modified pages)
+JOB_MEMORY_BUDGET_MB = 512  # Max RSS growth per job (0 = unlimited)
+
+# Multi-page previews (/api/preview-pages)
+PREVIEW_POOL_WORKERS = 4  # Render processes per server worker (1 = render inline)
+PREVIEW_MAX_PAGES = 50  # Max pages per request
+PREVIEW_PAGES_ZOOM = 1.0  # Default render scale (1.0 = 72 DPI)
+PREVIEW_SHEET_COLUMNS = 2  # Pages per row on the contact sheet
+
+# Startup warm-up (render a built-in sample PDF before serving requests)
+WARMUP_ON_STARTUP = True
+
+# Maximum filenames accepted per /api/parse-filenames request
+MAX_BULK_FILENAMES = 50000
+
+# Result cache: in-process LRU tier plus a tier shared by all workers
+CACHE_ENABLED = True
+CACHE_BACKEND = 'sqlite'  # 'sqlite' (shared on local disk), 'memory' (per process) or None
+CACHE_DB_FILE = 'cache.sqlite3'
+CACHE_TTL_SECONDS = 24 * 60 * 60
+CACHE_LOCAL_MAX_ENTRIES = 256
+CACHE_LOCAL_MAX_BYTES = 32 * 1024 * 1024
+CACHE_SHARED_MAX_ENTRIES = 10000
+CACHE_SHARED_MAX_BYTES = 256 * 1024 * 1024
+
+# Audit log (append-only JSON lines; replay with `python audit_log.py replay`)
+AUDIT_LOG_ENABLED = True
+AUDIT_LOG_FILE = 'audit/audit.jsonl'
+AUDIT_INDEX_FILE = 'audit/index.json'
+AUDIT_BATCH_SIZE = 64  # Records buffered before a write
+AUDIT_FLUSH_INTERVAL = 1.0  # Seconds between background flushes
+AUDIT_FSYNC_POLICY = 'batch'  # 'always', 'batch' or 'never'
+AUDIT_MAX_BYTES = 50 * 1024 * 1024  # Rotate the active file at this size
+AUDIT_RETAIN_SEGMENTS = 20  # Rotated files kept on disk (summaries stay in the index)
+
+# Throughput statistics for /api/stats (hourly/daily aggregates in SQLite)
+STATS_ENABLED = True
+STATS_DB_FILE = 'stats.sqlite3'
+STATS_HOURLY_RETENTION_DAYS = 14  # Daily buckets are kept indefinitely
+
 # Server settings
 HOST = '0.0.0.0'
 PORT = 5000
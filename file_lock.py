@@ -0,0 +1,29 @@
+"""
+Cross-process file locking shared by the audit log and invoice sequences
+"""
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-process locking unavailable
+    fcntl = None
+
+
+class FileLock:
+    """Exclusive lock on a lock file, held for the duration of a with-block (no-op where fcntl is unavailable)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
@@ -2,7 +2,170 @@
 Utility functions for parsing invoice information from filenames
 """
 import re
+import time
 from datetime import datetime
+from functools import lru_cache
+
+# Month names/abbreviations to month number
+MONTH_MAP = {
+    'jan': 1, 'january': 1,
+    'feb': 2, 'february': 2,
+    'mar': 3, 'march': 3,
+    'apr': 4, 'april': 4,
+    'may': 5,
+    'jun': 6, 'june': 6,
+    'jul': 7, 'july': 7,
+    'aug': 8, 'august': 8,
+    'sep': 9, 'september': 9,
+    'oct': 10, 'october': 10,
+    'nov': 11, 'november': 11,
+    'dec': 12, 'december': 12
+}
+
+# WG_Invoice{NUMBER}_{REF}_{DAY}_{MONTH}_{YEAR}_{TIME}, e.g.
+# WG_Invoice23432_DENLOU1-15_9_Dec_2025_1116_am
+WG_FILENAME_PATTERN = re.compile(
+    r'^WG_Invoice(?P<number>\d+)_(?P<reference>[^_]+)_(?P<day>\d{1,2})_(?P<month>[A-Za-z]+)_(?P<year>\d{4})'
+    r'(?:_(?P<time>.+))?$'
+)
+INVOICE_NUMBER_PATTERN = re.compile(r'Invoice(\d+)')
+HAS_LETTER_PATTERN = re.compile(r'[A-Za-z]')
+# Time part, e.g. "1116_am" -> 11:16
+TIME_PATTERN = re.compile(r'^(?P<hour>\d{1,2})(?P<minute>\d{2})_?(?P<meridiem>am|pm)?$', re.IGNORECASE)
+
+# Number of distinct filenames memoised by parse_invoice_filename
+PARSE_CACHE_SIZE = 65536
+# Time parts repeat across filenames (at most one per minute of the day)
+TIME_CACHE_SIZE = 4096
+
+# Columns returned by parse_invoice_filenames
+RESULT_COLUMNS = ('filename', 'success', 'invoice_number', 'reference', 'invoice_date', 'invoice_time', 'error')
+
+
+def _strip_extension(filename):
+    """Remove a trailing .pdf extension (any case)"""
+    if filename[-4:].lower() == '.pdf':
+        return filename[:-4]
+    return filename
+
+
+@lru_cache(maxsize=TIME_CACHE_SIZE)
+def _parse_time(time_part):
+    """Convert a filename time part such as "1116_am" to HH:MM, or None"""
+    if not time_part:
+        return None
+    match = TIME_PATTERN.match(time_part)
+    if not match:
+        return None
+    hour = int(match.group('hour'))
+    minute = int(match.group('minute'))
+    meridiem = (match.group('meridiem') or '').lower()
+    if meridiem == 'pm' and hour < 12:
+        hour += 12
+    elif meridiem == 'am' and hour == 12:
+        hour = 0
+    if hour > 23 or minute > 59:
+        return None
+    return f'{hour:02d}:{minute:02d}'
+
+
+def _days_in_month(year, month):
+    if month == 2:
+        return 29 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 28
+    return 30 if month in (4, 6, 9, 11) else 31
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_wg_filename(filename, with_time=True):
+    """
+    Single-pass parse of a WG_Invoice filename.
+
+    The date string is built directly rather than through datetime/strftime,
+    and the time part is only parsed when with_time is set.
+
+    Returns an immutable tuple so the memoised value can't be modified by callers:
+    (success, invoice_number, reference, invoice_date, invoice_time, error)
+    """
+    match = WG_FILENAME_PATTERN.match(_strip_extension(filename))
+    if not match:
+        return (False, None, None, None, None, 'Filename does not match expected format')
+
+    number, reference, day, month, year, time_part = match.groups()
+    if not HAS_LETTER_PATTERN.search(reference):
+        reference = None
+
+    month_num = MONTH_MAP.get(month.lower())
+    if not month_num:
+        return (False, number, reference, None, None, f'Invalid month: {month}')
+
+    day_num = int(day)
+    year_num = int(year)
+    if not 1 <= day_num <= _days_in_month(year_num, month_num) or year_num < 1:
+        return (False, number, reference, None, None, 'Invalid date: day is out of range for month')
+
+    return (True, number, reference, f'{year}-{month_num:02d}-{day_num:02d}',
+            _parse_time(time_part) if with_time else None, None)
+
+
+def parse_invoice_filename(filename):
+    """
+    Parse invoice number, reference, date and time from a filename in one pass.
+
+    Expected format: WG_Invoice{NUMBER}_{REF}_{DAY}_{MONTH}_{YEAR}_{TIME}.pdf
+    Example: WG_Invoice23432_DENLOU1-15_9_Dec_2025_1116_am.pdf
+
+    Results are memoised, so repeated filenames cost a dictionary lookup.
+
+    Returns:
+        dict: {'success': bool, 'invoice_number': str, 'reference': str,
+               'invoice_date': str (YYYY-MM-DD), 'invoice_time': str (HH:MM), 'error': str}
+    """
+    success, invoice_number, reference, invoice_date, invoice_time, error = _parse_wg_filename(filename, True)
+    return {
+        'success': success,
+        'invoice_number': invoice_number,
+        'reference': reference,
+        'invoice_date': invoice_date,
+        'invoice_time': invoice_time,
+        'error': error
+    }
+
+
+def parse_invoice_filenames(filenames, with_time=True):
+    """
+    Parse many filenames at once (for reconciliation jobs).
+
+    Args:
+        filenames: Iterable of filenames
+        with_time: Parse the time part; when False the invoice_time column is all None
+
+    Returns:
+        dict: Columnar results, one list per field in RESULT_COLUMNS, each
+              aligned with the input order, plus 'count' and 'parsed' totals.
+    """
+    columns = {name: [] for name in RESULT_COLUMNS}
+    success_col = columns['success']
+    number_col = columns['invoice_number']
+    reference_col = columns['reference']
+    date_col = columns['invoice_date']
+    time_col = columns['invoice_time']
+    error_col = columns['error']
+    filenames = list(filenames)
+    columns['filename'] = filenames
+
+    for filename in filenames:
+        success, invoice_number, reference, invoice_date, invoice_time, error = _parse_wg_filename(filename, with_time)
+        success_col.append(success)
+        number_col.append(invoice_number)
+        reference_col.append(reference)
+        date_col.append(invoice_date)
+        time_col.append(invoice_time)
+        error_col.append(error)
+
+    columns['count'] = len(filenames)
+    columns['parsed'] = sum(success_col)
+    return columns
+
 
 def parse_invoice_from_filename(filename):
     """
@@ -14,13 +177,27 @@ def parse_invoice_from_filename(filename):
     Returns:
         dict: {'invoice_number': str, 'invoice_date': str (YYYY-MM-DD), 'success': bool, 'error': str}
     """
+    # Fast path for the standard WG_Invoice format
+    success, invoice_number, _, invoice_date, _, _ = _parse_wg_filename(filename, False)
+    if success:
+        return {
+            'success': True,
+            'invoice_number': invoice_number,
+            'invoice_date': invoice_date
+        }
+
+    return _scan_invoice_from_filename(filename)
+
+
+def _scan_invoice_from_filename(filename):
+    """Fallback parser: scan the underscore-separated parts for a day_month_year date"""
     try:
         # Remove .pdf extension
         name = filename.replace('.pdf', '')
         
         # Pattern: WG_Invoice{NUMBER}_{REF}_{DAY}_{MONTH}_{YEAR}_{TIME}
         # Extract invoice number after "Invoice"
-        invoice_match = re.search(r'Invoice(\d+)', name)
+        invoice_match = INVOICE_NUMBER_PATTERN.search(name)
         if not invoice_match:
             return {
                 'success': False,
@@ -56,23 +233,8 @@ def parse_invoice_from_filename(filename):
         day, month, year = date_pattern
         
         # Convert month name to number
-        month_map = {
-            'jan': 1, 'january': 1,
-            'feb': 2, 'february': 2,
-            'mar': 3, 'march': 3,
-            'apr': 4, 'april': 4,
-            'may': 5,
-            'jun': 6, 'june': 6,
-            'jul': 7, 'july': 7,
-            'aug': 8, 'august': 8,
-            'sep': 9, 'september': 9,
-            'oct': 10, 'october': 10,
-            'nov': 11, 'november': 11,
-            'dec': 12, 'december': 12
-        }
-        
         month_lower = month.lower()
-        month_num = month_map.get(month_lower)
+        month_num = MONTH_MAP.get(month_lower)
         
         if not month_num:
             return {
@@ -103,6 +265,63 @@ def parse_invoice_from_filename(filename):
         }
 
 
+def _legacy_reference_from_filename(filename):
+    """Reference lookup as previously done by PDFTextExtractor (split and take part 2)"""
+    parts = filename.replace('.pdf', '').split('_')
+    if len(parts) >= 3 and not parts[2].isdigit() and re.search(r'[A-Za-z]', parts[2]):
+        return parts[2]
+    return None
+
+
+def benchmark(count=20000, distinct=None):
+    """
+    Compare the single-pass bulk parser against the scan + split path.
+
+    Args:
+        count: Total filenames to parse
+        distinct: Number of distinct filenames (default: all distinct, as in
+                  a historical reconciliation run; fewer means repeats hit the memo)
+    """
+    distinct = distinct or count
+    months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+    filenames = [
+        f"WG_Invoice{23000 + i % distinct}_REF{i % distinct}-1_{1 + i % distinct % 28}_"
+        f"{months[i % distinct % 12]}_2025_1116_am.pdf"
+        for i in range(count)
+    ]
+
+    def best_of(run, repeats=3):
+        """Fastest of a few runs, to keep scheduler noise out of the comparison"""
+        timings = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    def scan():
+        for filename in filenames:
+            _scan_invoice_from_filename(filename)
+            _legacy_reference_from_filename(filename)
+
+    def bulk(with_time):
+        _parse_wg_filename.cache_clear()
+        _parse_time.cache_clear()
+        parse_invoice_filenames(filenames, with_time)
+
+    scan_seconds = best_of(scan)
+    # The scan path returns number, date and reference; compare like for like first
+    date_only_seconds = best_of(lambda: bulk(False))
+    with_time_seconds = best_of(lambda: bulk(True))
+    repeat_seconds = best_of(lambda: parse_invoice_filenames(filenames, True))
+
+    print(f"Filenames: {count} ({distinct} distinct)")
+    print(f"Scan + split path:               {scan_seconds * 1000:8.1f} ms")
+    print(f"Bulk parser, no time column:     {date_only_seconds * 1000:8.1f} ms ({scan_seconds / date_only_seconds:.1f}x)")
+    print(f"Bulk parser, with time column:   {with_time_seconds * 1000:8.1f} ms ({scan_seconds / with_time_seconds:.1f}x)")
+    print(f"Same list again (memoised):      {repeat_seconds * 1000:8.1f} ms ({scan_seconds / repeat_seconds:.1f}x)")
+
+
 def test_parser():
     """Test the parser with example filename"""
     test_filename = "WG_Invoice23432_DENLOU1-15_9_Dec_2025_1116_am.pdf"
@@ -118,4 +337,8 @@ def test_parser():
 
 
 if __name__ == '__main__':
-    test_parser()
+    import sys
+    if '--benchmark' in sys.argv:
+        benchmark()
+    else:
+        test_parser()
@@ -1,6 +1,7 @@
 """
 Gunicorn configuration file for Invoice PDF Processor
 """
+import gc
 import multiprocessing
 
 # Server socket
@@ -14,6 +15,11 @@ worker_connections = 1000
 timeout = 120
 keepalive = 5
 
+# Load the application (imports, PDF warm-up) once in the master process.
+# Workers are forked from it and share the warmed state copy-on-write, so a
+# fresh or recycled worker serves its first request without a cold start.
+preload_app = True
+
 # Logging
 errorlog = "/var/log/invoice-processor/error.log"
 accesslog = "/var/log/invoice-processor/access.log"
@@ -31,6 +37,21 @@ user = None
 group = None
 tmp_upload_dir = None
 
+
+# Server hooks
+def when_ready(server):
+    """Freeze preloaded objects so workers don't dirty shared pages on GC"""
+    gc.freeze()
+    server.log.info("Application preloaded; %s objects frozen for copy-on-write sharing", gc.get_freeze_count())
+
+
+def post_fork(server, worker):
+    """Start this worker's cold-start clock; its first request is timed by the app"""
+    from warmup import mark_worker_forked
+    mark_worker_forked()
+    server.log.info("Worker spawned with preloaded application (pid: %s)", worker.pid)
+
+
 # SSL (if needed)
 # keyfile = "/path/to/keyfile"
 # certfile = "/path/to/certfile"
@@ -0,0 +1,118 @@
+"""
+Named invoice number sequences
+
+Each business entity (tenant) gets its own sequence with its own start value
+and display format, configured in config.INVOICE_SEQUENCES. The 'default'
+sequence keeps its state in invoice_tracker.json so existing deployments
+carry on where they left off; other sequences live in
+SEQUENCES_FOLDER/<name>.json.
+
+Allocation is atomic across gunicorn workers: each sequence has its own lock
+file, so a busy sequence never blocks allocations on another one.
+"""
+import json
+import os
+import threading
+from datetime import datetime
+
+import config
+from file_lock import FileLock
+
+DEFAULT_SEQUENCE = 'default'
+
+
+class SequenceStore:
+    """Allocates invoice numbers from named, independently locked sequences"""
+
+    def __init__(self, sequences, folder, default_tracker_file):
+        """
+        Args:
+            sequences: {name: {'start': int, 'format': str}} (format uses {number})
+            folder: Directory for non-default sequence state files
+            default_tracker_file: State file for the 'default' sequence
+        """
+        self.sequences = sequences
+        self.folder = folder
+        self.default_tracker_file = default_tracker_file
+        self._locks = {name: threading.Lock() for name in sequences}
+        os.makedirs(folder, exist_ok=True)
+
+    def names(self):
+        return list(self.sequences)
+
+    def _settings(self, name):
+        if name not in self.sequences:
+            raise ValueError(f"Unknown invoice sequence: {name}")
+        return self.sequences[name]
+
+    def _state_path(self, name):
+        if name == DEFAULT_SEQUENCE:
+            return self.default_tracker_file
+        return os.path.join(self.folder, f'{name}.json')
+
+    def _load(self, name):
+        """Load a sequence's state, initialising it from its start value"""
+        path = self._state_path(name)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                return json.load(f)
+        return {
+            'last_invoice_number': self._settings(name)['start'] - 1,
+            'last_updated': datetime.now().isoformat()
+        }
+
+    def _save(self, name, state):
+        """Write a sequence's state atomically (temp file + rename)"""
+        state['last_updated'] = datetime.now().isoformat()
+        path = self._state_path(name)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_path, path)
+
+    def peek(self, name=DEFAULT_SEQUENCE):
+        """Return the next number for a sequence without allocating it"""
+        self._settings(name)
+        return self._load(name)['last_invoice_number'] + 1
+
+    def allocate(self, name=DEFAULT_SEQUENCE):
+        """Atomically allocate and return the next number for a sequence"""
+        self._settings(name)
+        with self._locks[name], FileLock(self._state_path(name) + '.lock'):
+            state = self._load(name)
+            state['last_invoice_number'] += 1
+            self._save(name, state)
+            return state['last_invoice_number']
+
+    def restore(self, name, last_invoice_number):
+        """
+        Bring a sequence up to a replayed last allocated number (used when
+        replaying the audit log).
+
+        A sequence that is already ahead is left alone: the tracker is saved
+        before the allocation is logged, so a crash in between leaves it one
+        ahead of the log. A missing or corrupt state file is replaced outright.
+
+        Returns:
+            int: The sequence's last allocated number after the restore
+        """
+        self._settings(name)
+        with self._locks[name], FileLock(self._state_path(name) + '.lock'):
+            try:
+                with open(self._state_path(name), 'r') as f:
+                    state = json.load(f)
+                current = int(state['last_invoice_number'])
+            except (OSError, ValueError, KeyError, TypeError):
+                state, current = {}, None
+            state['last_invoice_number'] = last_invoice_number if current is None else max(current, last_invoice_number)
+            self._save(name, state)
+            return state['last_invoice_number']
+
+    def format(self, name, number):
+        """Format a number using the sequence's display format"""
+        return self._settings(name).get('format', '{number}').format(number=number)
+
+
+def create_sequence_store():
+    """Build the sequence store from config"""
+    return SequenceStore(config.INVOICE_SEQUENCES, config.SEQUENCES_FOLDER, config.INVOICE_TRACKER_FILE)
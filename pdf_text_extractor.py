@@ -1,10 +1,19 @@
 import fitz  # PyMuPDF
 import re
+from filename_parser import parse_invoice_filename
+from result_cache import file_digest
 
 
 class PDFTextExtractor:
     """Extract reference numbers from PDF invoices"""
     
+    def __init__(self, cache=None):
+        """
+        Args:
+            cache: Optional ResultCache; PDF extraction results are cached by file content
+        """
+        self.cache = cache
+    
     def extract_reference_from_pdf(self, pdf_path):
         """
         Extract the reference number from the PDF's "Ref" field.
@@ -93,6 +102,16 @@ class PDFTextExtractor:
             dict: {'success': bool, 'reference': str, 'error': str}
         """
         try:
+            # Single-pass (memoised) parse for the standard format
+            parsed = parse_invoice_filename(filename)
+            if parsed['reference']:
+                print(f"Extracted reference from filename: {parsed['reference']}")
+                return {
+                    'success': True,
+                    'reference': parsed['reference'],
+                    'error': None
+                }
+
             # Remove .pdf extension
             name = filename.replace('.pdf', '')
             
@@ -139,8 +158,14 @@ class PDFTextExtractor:
         Returns:
             dict: {'success': bool, 'reference': str, 'source': str, 'error': str}
         """
-        # Try PDF extraction first
-        result = self.extract_reference_from_pdf(pdf_path)
+        # Try PDF extraction first (cached by file content, shared across workers)
+        if self.cache is not None:
+            result = self.cache.get_or_compute(
+                f'ref:{file_digest(pdf_path)}',
+                lambda: self.extract_reference_from_pdf(pdf_path)
+            )
+        else:
+            result = self.extract_reference_from_pdf(pdf_path)
         
         if result['success']:
             result['source'] = 'pdf'
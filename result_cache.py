@@ -0,0 +1,434 @@
+"""
+Two-tier result cache shared across gunicorn workers
+
+Tier 1 is an in-process LRU (fast, private to one worker). Tier 2 is a shared
+backend that every worker on the host can read: SQLite on local disk by
+default, or any object implementing the CacheBackend interface (e.g. a
+Redis client wrapper). MemoryBackend is the local stand-in for such
+key/value stores and is handy for development.
+
+Values may be JSON-serialisable objects (result dicts) or raw bytes (rendered
+preview images). Entries expire after a TTL and are evicted least recently
+used when a tier exceeds its entry or byte limit.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+KIND_JSON = 'json'
+KIND_BYTES = 'bytes'
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file's contents (used as a cache key)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode(value):
+    """Encode a value as (kind, payload bytes)"""
+    if isinstance(value, (bytes, bytearray)):
+        return KIND_BYTES, bytes(value)
+    return KIND_JSON, json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def _decode(kind, payload):
+    """Decode a (kind, payload) pair back into a value"""
+    if kind == KIND_BYTES:
+        return payload
+    return json.loads(payload)
+
+
+class CacheBackend:
+    """
+    Interface for shared cache backends.
+
+    Payloads are bytes tagged with a kind string; expires_at is a Unix
+    timestamp. Implementations handle their own expiry and eviction.
+    """
+
+    def get(self, key):
+        """Return (kind, payload, expires_at) or None if missing/expired"""
+        raise NotImplementedError
+
+    def set(self, key, kind, payload, expires_at):
+        """Store a payload; returns the number of entries evicted"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def info(self):
+        """Return a dict describing the backend (entries, bytes, ...)"""
+        return {}
+
+
+class MemoryBackend(CacheBackend):
+    """
+    In-process stand-in for a Redis-like key/value store.
+
+    Not shared between processes; use it for development or when a real
+    network store is wired in behind the same interface.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            kind, payload, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return kind, payload, expires_at
+
+    def set(self, key, kind, payload, expires_at):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (kind, payload, expires_at)
+            self._bytes += len(payload)
+            evicted = 0
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                evicted += 1
+            return evicted
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def info(self):
+        return {'backend': 'memory', 'entries': len(self._entries), 'bytes': self._bytes}
+
+    def _remove(self, key):
+        kind, payload, expires_at = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Shared cache in a SQLite file on local disk.
+
+    Every worker on the host opens the same file; WAL mode lets readers
+    proceed while another worker writes. Connections are opened lazily per
+    process so the backend is safe to create before gunicorn forks.
+
+    Entry and byte totals are kept in a one-row meta table that every insert
+    and delete updates, so a set() never scans the table; eviction only runs
+    when the totals go over a limit. Reads never write: LRU touches are
+    buffered per process and applied with the next write (or once
+    touch_batch_size touches or touch_interval seconds have built up), so
+    eviction order is approximate.
+    """
+
+    SCHEMA_VERSION = 2
+
+    def __init__(self, db_path, max_entries=10000, max_bytes=256 * 1024 * 1024,
+                 touch_batch_size=64, touch_interval=30.0, sweep_interval=60.0):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.touch_batch_size = touch_batch_size
+        self.touch_interval = touch_interval
+        self.sweep_interval = sweep_interval
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._touches = {}
+        self._last_touch_flush = 0.0
+        self._last_sweep = 0.0
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if conn.execute('PRAGMA user_version').fetchone()[0] != self.SCHEMA_VERSION:
+                    # Older layouts kept size after the payload blob; it is only a cache, so start over
+                    conn.execute('DROP TABLE IF EXISTS cache')
+                    conn.execute('DROP TABLE IF EXISTS cache_meta')
+                    # Small columns come before the payload so reading them never touches the blob
+                    conn.execute(
+                        'CREATE TABLE cache ('
+                        'key TEXT PRIMARY KEY, kind TEXT NOT NULL, size INTEGER NOT NULL, '
+                        'expires_at REAL NOT NULL, accessed_at REAL NOT NULL, payload BLOB NOT NULL)'
+                    )
+                    conn.execute('CREATE INDEX cache_accessed ON cache (accessed_at, size)')
+                    conn.execute('CREATE INDEX cache_expires ON cache (expires_at, size)')
+                    conn.execute(
+                        'CREATE TABLE cache_meta (id INTEGER PRIMARY KEY CHECK (id = 0), '
+                        'entries INTEGER NOT NULL, bytes INTEGER NOT NULL)'
+                    )
+                    conn.execute('INSERT INTO cache_meta (id, entries, bytes) VALUES (0, 0, 0)')
+                    conn.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            self._conn = conn
+            self._pid = os.getpid()
+            self._touches = {}
+            self._last_touch_flush = time.time()
+        return self._conn
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute('SELECT kind, expires_at, payload FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is None or row[1] <= now:
+                # Expired rows are removed by the next sweep; a read never takes the write lock
+                return None
+            self._touches[key] = now
+            if len(self._touches) >= self.touch_batch_size or now - self._last_touch_flush >= self.touch_interval:
+                self._write(conn, lambda: None, now)
+            return row[0], bytes(row[2]), row[1]
+
+    def set(self, key, kind, payload, expires_at):
+        now = time.time()
+
+        def insert():
+            old = conn.execute('SELECT size FROM cache WHERE key = ?', (key,)).fetchone()
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (key, kind, size, expires_at, accessed_at, payload) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, kind, len(payload), expires_at, now, payload)
+            )
+            self._adjust(conn, 0 if old else 1, len(payload) - (old[0] if old else 0))
+            return self._evict(conn, now)
+
+        with self._lock:
+            conn = self._connection()
+            return self._write(conn, insert, now)
+
+    def _write(self, conn, operation, now):
+        """Run operation in a write transaction, applying buffered LRU touches first"""
+        touches = self._touches
+        self._touches = {}
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if touches:
+                conn.executemany(
+                    'UPDATE cache SET accessed_at = ? WHERE key = ?',
+                    [(accessed_at, key) for key, accessed_at in touches.items()]
+                )
+            result = operation()
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self._last_touch_flush = now
+        return result
+
+    def _adjust(self, conn, entries, size):
+        conn.execute('UPDATE cache_meta SET entries = entries + ?, bytes = bytes + ? WHERE id = 0', (entries, size))
+
+    def _totals(self, conn):
+        return conn.execute('SELECT entries, bytes FROM cache_meta WHERE id = 0').fetchone()
+
+    def _evict(self, conn, now):
+        """Sweep expired rows now and then; drop least recently used rows only when over a limit"""
+        entries, total_bytes = self._totals(conn)
+        over_limit = entries > self.max_entries or total_bytes > self.max_bytes
+        evicted = 0
+
+        if over_limit or now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            expired, expired_bytes = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache WHERE expires_at <= ?', (now,)
+            ).fetchone()
+            if expired:
+                conn.execute('DELETE FROM cache WHERE expires_at <= ?', (now,))
+                self._adjust(conn, -expired, -expired_bytes)
+                entries -= expired
+                total_bytes -= expired_bytes
+                evicted += expired
+
+        excess_entries = max(entries - self.max_entries, 0)
+        excess_bytes = total_bytes - self.max_bytes
+        if excess_entries <= 0 and excess_bytes <= 0:
+            return evicted
+
+        doomed = []
+        freed = 0
+        for key, size in conn.execute('SELECT key, size FROM cache ORDER BY accessed_at'):
+            if len(doomed) >= excess_entries and freed >= excess_bytes:
+                break
+            doomed.append((key,))
+            freed += size
+        conn.executemany('DELETE FROM cache WHERE key = ?', doomed)
+        self._adjust(conn, -len(doomed), -freed)
+        return evicted + len(doomed)
+
+    def delete(self, key):
+        with self._lock:
+            conn = self._connection()
+
+            def remove():
+                old = conn.execute('SELECT size FROM cache WHERE key = ?', (key,)).fetchone()
+                if old:
+                    conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+                    self._adjust(conn, -1, -old[0])
+
+            self._touches.pop(key, None)
+            self._write(conn, remove, time.time())
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+
+            def remove_all():
+                conn.execute('DELETE FROM cache')
+                conn.execute('UPDATE cache_meta SET entries = 0, bytes = 0 WHERE id = 0')
+
+            self._touches = {}
+            self._write(conn, remove_all, time.time())
+
+    def info(self):
+        with self._lock:
+            entries, total_bytes = self._totals(self._connection())
+        return {'backend': 'sqlite', 'path': self.db_path, 'entries': entries, 'bytes': total_bytes}
+
+
+class ResultCache:
+    """In-process LRU tier in front of a shared CacheBackend, with hit/miss counters"""
+
+    def __init__(self, shared=None, ttl_seconds=3600, local_max_entries=256, local_max_bytes=32 * 1024 * 1024):
+        self.shared = shared
+        self.ttl_seconds = ttl_seconds
+        self.local = MemoryBackend(local_max_entries, local_max_bytes)
+        self._counters = {
+            'local_hits': 0,
+            'shared_hits': 0,
+            'misses': 0,
+            'sets': 0,
+            'evictions': 0,
+            'errors': 0
+        }
+        self._lock = threading.Lock()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        entry = self.local.get(key)
+        if entry is not None:
+            self._count('local_hits')
+            return _decode(entry[0], entry[1])
+
+        if self.shared is not None:
+            try:
+                entry = self.shared.get(key)
+            except Exception as e:
+                print(f"Shared cache read failed: {e}")
+                self._count('errors')
+                entry = None
+            if entry is not None:
+                self._count('shared_hits')
+                # Promote to the local tier with the shared entry's expiry, not a fresh TTL
+                kind, payload, expires_at = entry
+                self.local.set(key, kind, payload, expires_at)
+                return _decode(kind, payload)
+
+        self._count('misses')
+        return None
+
+    def set(self, key, value, ttl_seconds=None):
+        """Store a JSON-serialisable value or bytes under key in both tiers"""
+        kind, payload = _encode(value)
+        expires_at = time.time() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+        evicted = self.local.set(key, kind, payload, expires_at)
+        if self.shared is not None:
+            try:
+                evicted += self.shared.set(key, kind, payload, expires_at)
+            except Exception as e:
+                print(f"Shared cache write failed: {e}")
+                self._count('errors')
+        self._count('sets')
+        if evicted:
+            self._count('evictions', evicted)
+
+    def get_or_compute(self, key, compute, ttl_seconds=None):
+        """Return the cached value for key, computing and storing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.set(key, value, ttl_seconds)
+        return value
+
+    def delete(self, key):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self):
+        """Hit/miss counters for this process plus tier sizes"""
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters['local_hits'] + counters['shared_hits'] + counters['misses']
+        counters['hit_rate'] = round((lookups - counters['misses']) / lookups, 4) if lookups else 0.0
+        counters['pid'] = os.getpid()
+        counters['local'] = self.local.info()
+        try:
+            counters['shared'] = self.shared.info() if self.shared is not None else None
+        except Exception as e:
+            counters['shared'] = {'error': str(e)}
+        return counters
+
+
+def create_cache():
+    """Build the application cache from config"""
+    if not config.CACHE_ENABLED:
+        return None
+
+    if config.CACHE_BACKEND == 'sqlite':
+        shared = SQLiteBackend(config.CACHE_DB_FILE, config.CACHE_SHARED_MAX_ENTRIES, config.CACHE_SHARED_MAX_BYTES)
+    elif config.CACHE_BACKEND == 'memory':
+        shared = MemoryBackend(config.CACHE_SHARED_MAX_ENTRIES, config.CACHE_SHARED_MAX_BYTES)
+    elif config.CACHE_BACKEND is None:
+        shared = None
+    else:
+        raise ValueError(f"Unknown CACHE_BACKEND: {config.CACHE_BACKEND}")
+
+    return ResultCache(
+        shared,
+        ttl_seconds=config.CACHE_TTL_SECONDS,
+        local_max_entries=config.CACHE_LOCAL_MAX_ENTRIES,
+        local_max_bytes=config.CACHE_LOCAL_MAX_BYTES
+    )
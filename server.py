@@ -1,55 +1,188 @@
-from flask import Flask, request, jsonify, send_file, send_from_directory
+import time
+_startup_started = time.perf_counter()
+
+from flask import Flask, request, jsonify, send_file, send_from_directory, g
 from flask_cors import CORS
+import base64
+import io
 import os
-import json
 from datetime import datetime
 from werkzeug.utils import secure_filename
 import config
-from pdf_processor import SimplePDFProcessor
+import fitz  # PyMuPDF
+from pdf_processor import SimplePDFProcessor, build_contact_sheet
 from pdf_text_extractor import PDFTextExtractor
+from filename_parser import parse_invoice_from_filename, parse_invoice_filename, parse_invoice_filenames
+from warmup import warm_up, format_report, record_first_request, worker_start
+from result_cache import create_cache, file_digest
+from audit_log import create_audit_log
+from invoice_sequences import create_sequence_store, DEFAULT_SEQUENCE
+from stats_store import create_stats_store
+
+_imports_ms = (time.perf_counter() - _startup_started) * 1000
 
 app = Flask(__name__)
 CORS(app)
 
-# Create necessary directories
-os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(config.OUTPUT_FOLDER, exist_ok=True)
-os.makedirs(config.TEMP_FOLDER, exist_ok=True)
+# Preview render processes are spawned and re-import this file as __mp_main__
+# when the server is started with `python server.py`. They only need
+# pdf_processor, so directories, stores and warm-up are set up in the server
+# process alone (under gunicorn __main__ is gunicorn, so this never applies).
+if __name__ != '__mp_main__':
+    # Create necessary directories
+    os.makedirs(config.UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(config.OUTPUT_FOLDER, exist_ok=True)
+    os.makedirs(config.TEMP_FOLDER, exist_ok=True)
 
-# Initialize PDF processor and text extractor
-pdf_processor = SimplePDFProcessor()
-text_extractor = PDFTextExtractor()
+    # Initialize invoice sequences, audit log, result cache, PDF processor and text extractor
+    sequence_store = create_sequence_store()
+    audit_log = create_audit_log()
+    stats_store = create_stats_store()
+    result_cache = create_cache()
+    pdf_processor = SimplePDFProcessor()
+    text_extractor = PDFTextExtractor(cache=result_cache)
 
-def get_invoice_tracker():
-    """Load invoice tracker from JSON file"""
-    if os.path.exists(config.INVOICE_TRACKER_FILE):
-        with open(config.INVOICE_TRACKER_FILE, 'r') as f:
-            return json.load(f)
+    # Warm up PDF rendering once per process. With gunicorn's preload_app this
+    # runs in the master and the warmed state is inherited by every worker.
+    if config.WARMUP_ON_STARTUP:
+        startup_report = warm_up(pdf_processor, text_extractor)
     else:
-        # Initialize with starting number
-        return {
-            'last_invoice_number': config.STARTING_INVOICE_NUMBER - 1,
-            'last_updated': datetime.now().isoformat()
-        }
+        startup_report = {'success': True, 'pid': os.getpid(), 'timings_ms': {}, 'total_ms': 0.0, 'error': None}
+    startup_report['timings_ms'] = {'imports': round(_imports_ms, 2), **startup_report['timings_ms']}
+    startup_report['startup_ms'] = round((time.perf_counter() - _startup_started) * 1000, 2)
+    print(format_report(startup_report))
 
-def save_invoice_tracker(tracker):
-    """Save invoice tracker to JSON file"""
-    tracker['last_updated'] = datetime.now().isoformat()
-    with open(config.INVOICE_TRACKER_FILE, 'w') as f:
-        json.dump(tracker, f, indent=2)
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
 
-def get_next_invoice_number():
-    """Get the next invoice number"""
-    tracker = get_invoice_tracker()
-    next_number = tracker['last_invoice_number'] + 1
-    return next_number
+@app.after_request
+def record_cold_start(response):
+    """Record this worker's first-request latency (once per process)"""
+    started = g.get('request_started')
+    cold_start = record_first_request(started) if started is not None else None
+    if cold_start is not None:
+        since_fork = cold_start['fork_to_first_response_ms']
+        print(f"Worker {cold_start['pid']} first request ({request.path}): {cold_start['first_request_ms']}ms"
+              + (f" ({since_fork}ms after fork)" if since_fork is not None else ''))
+        if stats_store is not None:
+            try:
+                stats_store.record_cold_start(cold_start['pid'], request.path, cold_start['first_request_ms'],
+                                              cold_start['fork_to_first_response_ms'])
+            except Exception as e:
+                print(f"Cold start stats update failed: {e}")
+    return response
+
+def audit(event, **fields):
+    """Append a record to the audit log (no-op when audit logging is disabled)"""
+    if audit_log is None:
+        return
+    try:
+        audit_log.record(event, **fields)
+    except Exception as e:
+        print(f"Audit log write failed: {e}")
+
+def record_processing_stats(success, started):
+    """Add a /api/process-invoice completion to the throughput statistics"""
+    if stats_store is None:
+        return
+    try:
+        stats_store.record(success, (time.perf_counter() - started) * 1000)
+    except Exception as e:
+        print(f"Stats update failed: {e}")
+
+def get_next_invoice_number(sequence=DEFAULT_SEQUENCE):
+    """Get the next invoice number for a sequence"""
+    return sequence_store.peek(sequence)
+
+def render_preview(pdf_path, preview_image_path):
+    """
+    Render the preview image for a PDF, using the result cache when enabled.
+    
+    Returns:
+        bytes: PNG data, or None if rendering failed
+    """
+    cache_key = None
+    if result_cache is not None:
+        cache_key = f'preview:{file_digest(pdf_path)}'
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
+    if not pdf_processor.generate_preview(pdf_path, preview_image_path):
+        return None
+    
+    with open(preview_image_path, 'rb') as f:
+        image_data = f.read()
+    
+    if cache_key is not None:
+        result_cache.set(cache_key, image_data)
+    return image_data
+
+def parse_page_range(spec, page_count):
+    """
+    Parse a 1-based page range such as "1-3,5" into zero-based page numbers.
+    An empty spec means all pages.
+    """
+    if not spec:
+        return list(range(page_count))
+    
+    pages = []
+    for part in spec.split(','):
+        part = part.strip()
+        try:
+            if '-' in part:
+                start, end = part.split('-', 1)
+                start = int(start) if start else 1
+                end = int(end) if end else page_count
+            else:
+                start = end = int(part)
+        except ValueError:
+            raise ValueError(f'Invalid page range: {part}')
+        if start < 1 or end > page_count or start > end:
+            raise ValueError(f'Invalid page range: {part} (document has {page_count} pages)')
+        pages.extend(range(start - 1, end))
+    return sorted(set(pages))
 
-def increment_invoice_number():
-    """Increment and save the invoice number"""
-    tracker = get_invoice_tracker()
-    tracker['last_invoice_number'] += 1
-    save_invoice_tracker(tracker)
-    return tracker['last_invoice_number']
+def preview_pages_response(pdf_path, page_spec, output_format, zoom):
+    """Render a page range of a PDF as a contact sheet PNG or a JSON set of page images"""
+    with fitz.open(pdf_path) as doc:
+        page_count = len(doc)
+    
+    if not 0 < zoom <= 4:
+        raise ValueError('zoom must be between 0 and 4')
+    
+    if output_format not in ('sheet', 'json'):
+        raise ValueError(f"Unknown format: {output_format} (use 'sheet' or 'json')")
+    
+    page_numbers = parse_page_range(page_spec, page_count)
+    if len(page_numbers) > config.PREVIEW_MAX_PAGES:
+        raise ValueError(f'Too many pages requested (max {config.PREVIEW_MAX_PAGES})')
+    
+    pages = pdf_processor.render_pages(pdf_path, page_numbers, zoom, result_cache)
+    
+    if output_format == 'json':
+        return jsonify({
+            'success': True,
+            'pageCount': page_count,
+            'pages': [
+                {
+                    'page': page['page'] + 1,
+                    'cached': page['cached'],
+                    'image': base64.b64encode(page['image']).decode('ascii')
+                }
+                for page in pages
+            ]
+        })
+    
+    sheet = build_contact_sheet([page['image'] for page in pages], config.PREVIEW_SHEET_COLUMNS)
+    return send_file(io.BytesIO(sheet), mimetype='image/png')
+
+def increment_invoice_number(sequence=DEFAULT_SEQUENCE):
+    """Allocate the next invoice number from a sequence"""
+    number = sequence_store.allocate(sequence)
+    audit('allocation', sequence=sequence, invoice_number=number)
+    return number
 
 @app.route('/')
 def index():
@@ -70,10 +203,57 @@ def serve_static(path):
 def api_next_invoice_number():
     """Get the next invoice number"""
     try:
-        next_number = get_next_invoice_number()
+        sequence = request.args.get('sequence', DEFAULT_SEQUENCE)
+        next_number = get_next_invoice_number(sequence)
+        return jsonify({
+            'success': True,
+            'sequence': sequence,
+            'invoiceNumber': sequence_store.format(sequence, next_number)
+        })
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+@app.route('/api/sequences', methods=['GET'])
+def api_sequences():
+    """List the configured invoice number sequences and their next numbers"""
+    try:
+        return jsonify({
+            'success': True,
+            'sequences': [
+                {
+                    'name': name,
+                    'nextInvoiceNumber': sequence_store.format(name, sequence_store.peek(name))
+                }
+                for name in sequence_store.names()
+            ]
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
+@app.route('/api/stats', methods=['GET'])
+def api_stats():
+    """Return pre-aggregated processing throughput, failure rate and latency"""
+    try:
+        if stats_store is None:
+            return jsonify({'success': True, 'enabled': False})
+        
+        hours = min(max(request.args.get('hours', 24, type=int), 1), 24 * config.STATS_HOURLY_RETENTION_DAYS)
+        days = min(max(request.args.get('days', 30, type=int), 1), 3660)
         return jsonify({
             'success': True,
-            'invoiceNumber': str(next_number)
+            'enabled': True,
+            'stats': stats_store.summary(hours, days)
         })
     except Exception as e:
         return jsonify({
@@ -81,12 +261,64 @@ def api_next_invoice_number():
             'message': str(e)
         }), 500
 
+@app.route('/api/startup-report', methods=['GET'])
+def api_startup_report():
+    """
+    Return the startup/warm-up timings (from the process that ran the warm-up),
+    this worker's cold start, and first-request latency percentiles across
+    recent worker starts.
+    """
+    cold_starts = None
+    if stats_store is not None:
+        try:
+            cold_starts = stats_store.cold_start_summary()
+        except Exception as e:
+            cold_starts = {'error': str(e)}
+    return jsonify({
+        'success': True,
+        'workerPid': os.getpid(),
+        'report': startup_report,
+        'worker': {key: value for key, value in worker_start.items() if key != 'forked_at'},
+        'coldStarts': cold_starts
+    })
+
+def parse_filename_result(filename):
+    """Build the /api/parse-filename response for a filename"""
+    # Standard filenames give number, reference and date in one pass
+    parsed = parse_invoice_filename(filename)
+    if parsed['success']:
+        return {
+            'success': True,
+            'invoice_number': parsed['reference'] or parsed['invoice_number'],
+            'invoice_date': parsed['invoice_date'],
+            'invoice_time': parsed['invoice_time']
+        }
+    
+    # Parse date from filename
+    result = parse_invoice_from_filename(filename)
+    
+    # Also try to extract reference from filename
+    ref_result = text_extractor.extract_reference_from_filename(filename)
+    if ref_result['success']:
+        result['invoice_number'] = ref_result['reference']
+    
+    return result
+
+@app.route('/api/cache-stats', methods=['GET'])
+def api_cache_stats():
+    """Return cache hit/miss counters for this worker and shared tier size"""
+    if result_cache is None:
+        return jsonify({'success': True, 'enabled': False})
+    return jsonify({
+        'success': True,
+        'enabled': True,
+        'stats': result_cache.stats()
+    })
+
 @app.route('/api/parse-filename', methods=['POST'])
 def api_parse_filename():
     """Parse invoice reference and date from filename"""
     try:
-        from filename_parser import parse_invoice_from_filename
-        
         data = request.get_json()
         filename = data.get('filename')
         
@@ -96,15 +328,46 @@ def api_parse_filename():
                 'error': 'No filename provided'
             }), 400
         
-        # Parse date from filename
-        result = parse_invoice_from_filename(filename)
+        # Not routed through result_cache: the parse is memoised in-process and
+        # a shared-tier lookup costs more than parsing again
+        return jsonify(parse_filename_result(filename))
         
-        # Also try to extract reference from filename
-        ref_result = text_extractor.extract_reference_from_filename(filename)
-        if ref_result['success']:
-            result['invoice_number'] = ref_result['reference']
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/parse-filenames', methods=['POST'])
+def api_parse_filenames():
+    """Parse a list of filenames, returning columnar results"""
+    try:
+        data = request.get_json(silent=True) or {}
+        filenames = data.get('filenames')
+        
+        if not isinstance(filenames, list) or not all(isinstance(name, str) for name in filenames):
+            return jsonify({
+                'success': False,
+                'error': 'filenames must be a list of strings'
+            }), 400
+        
+        if len(filenames) > config.MAX_BULK_FILENAMES:
+            return jsonify({
+                'success': False,
+                'error': f'Too many filenames (max {config.MAX_BULK_FILENAMES})'
+            }), 400
+        
+        with_time = data.get('withTime', True)
+        if not isinstance(with_time, bool):
+            return jsonify({
+                'success': False,
+                'error': 'withTime must be true or false'
+            }), 400
         
-        return jsonify(result)
+        return jsonify({
+            'success': True,
+            'results': parse_invoice_filenames(filenames, with_time)
+        })
         
     except Exception as e:
         return jsonify({
@@ -153,6 +416,7 @@ def api_extract_reference():
             }), 400
             
     except Exception as e:
+        audit('failure', endpoint='extract-reference', error=str(e))
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/preview', methods=['POST'])
@@ -176,19 +440,21 @@ def api_preview():
         
         # Generate preview image
         preview_image_path = os.path.join(config.TEMP_FOLDER, f'preview_{filename}.png')
-        success = pdf_processor.generate_preview(temp_pdf_path, preview_image_path)
+        image_data = render_preview(temp_pdf_path, preview_image_path)
         
-        if success:
-            return send_file(preview_image_path, mimetype='image/png')
+        if image_data is not None:
+            return send_file(io.BytesIO(image_data), mimetype='image/png')
         else:
             return jsonify({'success': False, 'message': 'Failed to generate preview'}), 500
             
     except Exception as e:
+        audit('failure', endpoint='preview', error=str(e))
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @app.route('/api/process-invoice', methods=['POST'])
 def api_process_invoice():
     """Process the uploaded invoice PDF"""
+    started = time.perf_counter()
     try:
         # Validate request
         if 'file' not in request.files:
@@ -199,10 +465,14 @@ def api_process_invoice():
         invoice_date = request.form.get('invoiceDate')
         customer_abn = request.form.get('customerABN', '')  # Optional field
         exclude_discount = request.form.get('excludeDiscount', 'true') == 'true'  # Default to true
+        sequence = request.form.get('sequence', DEFAULT_SEQUENCE)
         
         if not invoice_number or not invoice_date:
             return jsonify({'success': False, 'message': 'Missing invoice details'}), 400
         
+        if sequence not in sequence_store.names():
+            return jsonify({'success': False, 'message': f'Unknown invoice sequence: {sequence}'}), 400
+        
         if file.filename == '':
             return jsonify({'success': False, 'message': 'No file selected'}), 400
         
@@ -232,14 +502,29 @@ def api_process_invoice():
             exclude_discount
         )
         
+        # Allocate the next invoice number before recording the outcome, so a
+        # failed allocation is recorded once (as a failure, by the except below)
+        if success:
+            increment_invoice_number(sequence)
+        
+        audit(
+            'process',
+            success=success,
+            input_filename=input_filename,
+            output_filename=output_filename,
+            reference=invoice_number,
+            sequence=sequence,
+            duration_ms=round((time.perf_counter() - started) * 1000, 2),
+            job=pdf_processor.last_job_stats
+        )
+        record_processing_stats(success, started)
+        
         if success:
-            # Increment invoice number for next use
-            increment_invoice_number()
-            
             return jsonify({
                 'success': True,
                 'message': 'Invoice processed successfully',
-                'filename': output_filename
+                'filename': output_filename,
+                'jobStats': pdf_processor.last_job_stats
             })
         else:
             return jsonify({
@@ -250,6 +535,9 @@ def api_process_invoice():
     except Exception as e:
         import traceback
         traceback.print_exc()
+        audit('failure', endpoint='process-invoice', error=str(e),
+              duration_ms=round((time.perf_counter() - started) * 1000, 2))
+        record_processing_stats(False, started)
         return jsonify({
             'success': False,
             'message': f'Error: {str(e)}'
@@ -266,28 +554,92 @@ def api_preview_processed(filename):
         
         # Generate preview
         preview_path = os.path.join(config.TEMP_FOLDER, f'processed_{filename}.png')
-        success = pdf_processor.generate_preview(pdf_path, preview_path)
+        image_data = render_preview(pdf_path, preview_path)
         
-        if success:
-            return send_file(preview_path, mimetype='image/png')
+        if image_data is not None:
+            return send_file(io.BytesIO(image_data), mimetype='image/png')
         else:
             return jsonify({'success': False, 'message': 'Failed to generate preview'}), 500
             
     except Exception as e:
+        audit('failure', endpoint='preview-processed', error=str(e))
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/preview-pages', methods=['POST'])
+def api_preview_pages():
+    """Preview several pages of an uploaded PDF (contact sheet or JSON page images)"""
+    try:
+        if 'file' not in request.files:
+            return jsonify({'success': False, 'message': 'No file uploaded'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'success': False, 'message': 'No file selected'}), 400
+        
+        if not file.filename.endswith('.pdf'):
+            return jsonify({'success': False, 'message': 'File must be a PDF'}), 400
+        
+        # Save uploaded file temporarily
+        filename = secure_filename(file.filename)
+        temp_pdf_path = os.path.join(config.TEMP_FOLDER, f'preview_pages_{filename}')
+        file.save(temp_pdf_path)
+        
+        try:
+            return preview_pages_response(
+                temp_pdf_path,
+                request.form.get('pages', ''),
+                request.form.get('format', 'sheet'),
+                float(request.form.get('zoom', config.PREVIEW_PAGES_ZOOM))
+            )
+        finally:
+            try:
+                os.remove(temp_pdf_path)
+            except OSError:
+                pass
+            
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        audit('failure', endpoint='preview-pages', error=str(e))
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/preview-processed-pages/<filename>', methods=['GET'])
+def api_preview_processed_pages(filename):
+    """Preview several pages of a processed PDF (contact sheet or JSON page images)"""
+    try:
+        pdf_path = os.path.join(config.OUTPUT_FOLDER, secure_filename(filename))
+        
+        if not os.path.exists(pdf_path):
+            return jsonify({'success': False, 'message': 'File not found'}), 404
+        
+        return preview_pages_response(
+            pdf_path,
+            request.args.get('pages', ''),
+            request.args.get('format', 'sheet'),
+            float(request.args.get('zoom', config.PREVIEW_PAGES_ZOOM))
+        )
+            
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        audit('failure', endpoint='preview-processed-pages', error=str(e))
         return jsonify({'success': False, 'message': str(e)}), 500
 
 @app.route('/api/download/<filename>', methods=['GET'])
 def api_download(filename):
     """Download processed PDF"""
     try:
-        return send_from_directory(
+        response = send_from_directory(
             config.OUTPUT_FOLDER,
             filename,
             as_attachment=True,
             download_name=filename,
             mimetype='application/pdf'
         )
+        audit('download', filename=filename)
+        return response
     except Exception as e:
+        audit('failure', endpoint='download', filename=filename, error=str(e))
         return jsonify({
             'success': False,
             'message': f'File not found: {str(e)}'
@@ -0,0 +1,235 @@
+"""
+Pre-aggregated throughput statistics for /api/stats
+
+Each /api/process-invoice completion adds one observation to an hourly and a
+daily bucket: success/failure counts, latency sum and max, and a fixed-bound
+latency histogram. Buckets live in a small SQLite file shared by all gunicorn
+workers and are updated with a single UPSERT, so queries cost O(buckets)
+however many invoices have been processed.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import config
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BOUNDS_MS = (100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+HISTOGRAM_COLUMNS = [f'h{index}' for index in range(len(LATENCY_BOUNDS_MS) + 1)]
+
+HOUR = 'hour'
+DAY = 'day'
+
+
+def _bucket_starts(when):
+    """Local hour and day bucket start timestamps for a datetime"""
+    hour = when.replace(minute=0, second=0, microsecond=0)
+    day = hour.replace(hour=0)
+    return int(hour.timestamp()), int(day.timestamp())
+
+
+def _histogram_index(duration_ms):
+    for index, bound in enumerate(LATENCY_BOUNDS_MS):
+        if duration_ms <= bound:
+            return index
+    return len(LATENCY_BOUNDS_MS)
+
+
+def _percentile(histogram, fraction):
+    """Estimate a latency percentile (ms) as the upper bound of the bucket containing it"""
+    total = sum(histogram)
+    if not total:
+        return None
+    target = total * fraction
+    running = 0
+    for index, count in enumerate(histogram):
+        running += count
+        if running >= target:
+            return LATENCY_BOUNDS_MS[index] if index < len(LATENCY_BOUNDS_MS) else None
+    return None
+
+
+def _nearest_rank(sorted_values, fraction):
+    """Exact nearest-rank percentile of a sorted list"""
+    return sorted_values[max(math.ceil(len(sorted_values) * fraction) - 1, 0)]
+
+
+class StatsStore:
+    """Hourly and daily processing aggregates in SQLite"""
+
+    def __init__(self, db_path, hourly_retention_days=14):
+        self.db_path = db_path
+        self.hourly_retention_days = hourly_retention_days
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._last_prune = 0
+
+    def _connection(self):
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS buckets ('
+                'granularity TEXT NOT NULL, bucket_start INTEGER NOT NULL, '
+                'successes INTEGER NOT NULL DEFAULT 0, failures INTEGER NOT NULL DEFAULT 0, '
+                'latency_sum_ms REAL NOT NULL DEFAULT 0, latency_max_ms REAL NOT NULL DEFAULT 0, '
+                + ', '.join(f'{column} INTEGER NOT NULL DEFAULT 0' for column in HISTOGRAM_COLUMNS)
+                + ', PRIMARY KEY (granularity, bucket_start)) WITHOUT ROWID'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cold_starts ('
+                'recorded_at REAL NOT NULL, pid INTEGER NOT NULL, path TEXT, '
+                'first_request_ms REAL NOT NULL, fork_to_first_response_ms REAL)'
+            )
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def record(self, success, duration_ms, when=None):
+        """
+        Add one processing result to its hour and day buckets.
+
+        Args:
+            success: Whether the invoice was processed successfully
+            duration_ms: Request processing time in milliseconds
+            when: datetime of completion (default: now)
+        """
+        hour_start, day_start = _bucket_starts(when or datetime.now())
+        histogram_column = HISTOGRAM_COLUMNS[_histogram_index(duration_ms)]
+        successes, failures = (1, 0) if success else (0, 1)
+        sql = (
+            f'INSERT INTO buckets (granularity, bucket_start, successes, failures, latency_sum_ms, latency_max_ms, {histogram_column}) '
+            'VALUES (?, ?, ?, ?, ?, ?, 1) '
+            'ON CONFLICT (granularity, bucket_start) DO UPDATE SET '
+            'successes = successes + excluded.successes, failures = failures + excluded.failures, '
+            'latency_sum_ms = latency_sum_ms + excluded.latency_sum_ms, '
+            'latency_max_ms = MAX(latency_max_ms, excluded.latency_max_ms), '
+            f'{histogram_column} = {histogram_column} + 1'
+        )
+        with self._lock:
+            conn = self._connection()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                for granularity, bucket_start in ((HOUR, hour_start), (DAY, day_start)):
+                    conn.execute(sql, (granularity, bucket_start, successes, failures, duration_ms, duration_ms))
+                self._prune(conn)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def record_cold_start(self, pid, path, first_request_ms, fork_to_first_response_ms=None):
+        """Add one worker's first-request latency (see warmup.record_first_request)"""
+        with self._lock:
+            self._connection().execute(
+                'INSERT INTO cold_starts (recorded_at, pid, path, first_request_ms, fork_to_first_response_ms) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (time.time(), pid, path, first_request_ms, fork_to_first_response_ms)
+            )
+
+    def cold_start_summary(self, limit=1000):
+        """First-request latency percentiles over the most recent worker starts"""
+        with self._lock:
+            latencies = sorted(row[0] for row in self._connection().execute(
+                'SELECT first_request_ms FROM cold_starts ORDER BY recorded_at DESC LIMIT ?', (limit,)
+            ))
+        if not latencies:
+            return {'workers': 0, 'p50Ms': None, 'p99Ms': None, 'maxMs': None}
+        return {
+            'workers': len(latencies),
+            'p50Ms': round(_nearest_rank(latencies, 0.5), 2),
+            'p99Ms': round(_nearest_rank(latencies, 0.99), 2),
+            'maxMs': round(latencies[-1], 2)
+        }
+
+    def _prune(self, conn):
+        """Drop hourly buckets and cold starts past retention (at most once an hour per process)"""
+        now = time.time()
+        if now - self._last_prune < 3600:
+            return
+        self._last_prune = now
+        cutoff = int(now - self.hourly_retention_days * 86400)
+        conn.execute('DELETE FROM buckets WHERE granularity = ? AND bucket_start < ?', (HOUR, cutoff))
+        conn.execute('DELETE FROM cold_starts WHERE recorded_at < ?', (cutoff,))
+
+    def buckets(self, granularity, since):
+        """Return bucket dicts of a granularity starting at or after a timestamp, oldest first"""
+        with self._lock:
+            rows = self._connection().execute(
+                'SELECT bucket_start, successes, failures, latency_sum_ms, latency_max_ms, '
+                + ', '.join(HISTOGRAM_COLUMNS)
+                + ' FROM buckets WHERE granularity = ? AND bucket_start >= ? ORDER BY bucket_start',
+                (granularity, since)
+            ).fetchall()
+        return [_bucket_dict(row) for row in rows]
+
+    def summary(self, hours=24, days=30):
+        """
+        Stats for the dashboard: hourly buckets for the last `hours`, daily
+        buckets for the last `days`, and totals over each range.
+        """
+        now = datetime.now()
+        hour_start, day_start = _bucket_starts(now)
+        hourly = self.buckets(HOUR, hour_start - (hours - 1) * 3600)
+        daily_since = int((datetime.fromtimestamp(day_start) - timedelta(days=days - 1)).timestamp())
+        daily = self.buckets(DAY, daily_since)
+        today = daily[-1] if daily and daily[-1]['start'] == day_start else _bucket_dict((day_start,) + (0,) * (4 + len(HISTOGRAM_COLUMNS)))
+        return {
+            'hourly': hourly,
+            'daily': daily,
+            'today': today,
+            'lastHours': _totals(hourly),
+            'lastDays': _totals(daily),
+            'currentHourStart': hour_start,
+            'latencyBoundsMs': list(LATENCY_BOUNDS_MS)
+        }
+
+
+def _bucket_dict(row):
+    bucket_start, successes, failures, latency_sum_ms, latency_max_ms = row[:5]
+    histogram = list(row[5:])
+    total = successes + failures
+    return {
+        'start': bucket_start,
+        'label': datetime.fromtimestamp(bucket_start).isoformat(),
+        'total': total,
+        'successes': successes,
+        'failures': failures,
+        'failureRate': round(failures / total, 4) if total else 0.0,
+        'avgMs': round(latency_sum_ms / total, 1) if total else None,
+        'maxMs': round(latency_max_ms, 1) if total else None,
+        'latencySumMs': round(latency_sum_ms, 1),
+        'histogram': histogram
+    }
+
+
+def _totals(buckets):
+    """Combine buckets into one total"""
+    successes = sum(bucket['successes'] for bucket in buckets)
+    failures = sum(bucket['failures'] for bucket in buckets)
+    total = successes + failures
+    latency_sum = sum(bucket['latencySumMs'] for bucket in buckets)
+    histogram = [sum(counts) for counts in zip(*(bucket['histogram'] for bucket in buckets))] or [0] * len(HISTOGRAM_COLUMNS)
+    return {
+        'total': total,
+        'successes': successes,
+        'failures': failures,
+        'failureRate': round(failures / total, 4) if total else 0.0,
+        'avgMs': round(latency_sum / total, 1) if total else None,
+        'maxMs': max((bucket['maxMs'] for bucket in buckets if bucket['maxMs'] is not None), default=None),
+        'p50Ms': _percentile(histogram, 0.5),
+        'p95Ms': _percentile(histogram, 0.95),
+        'histogram': histogram
+    }
+
+
+def create_stats_store():
+    """Build the stats store from config"""
+    if not config.STATS_ENABLED:
+        return None
+    return StatsStore(config.STATS_DB_FILE, config.STATS_HOURLY_RETENTION_DAYS)
@@ -0,0 +1,257 @@
+"""
+Visual regression harness for the invoice overlay
+
+Processes a fixture corpus with SimplePDFProcessor, renders every output page
+at low DPI and compares it with golden images using vectorised NumPy pixel
+diffs. Each page has tolerance regions: the overlay areas are checked strictly,
+the rest of the page loosely. Areas the overlay must blank out (header, footer,
+Total Paid line) must be pure white. Text-position checks make sure the
+inserted labels and values sit where the layout expects them.
+
+Usage:
+    python visual_regression.py            # Check against golden images
+    python visual_regression.py --update   # Regenerate golden images after an intended layout change
+
+Exits non-zero on any failure; diff images are written to DIFF_FOLDER.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+import numpy as np
+
+from pdf_processor import SimplePDFProcessor
+
+GOLDEN_FOLDER = 'visual_golden'
+DIFF_FOLDER = os.path.join('temp', 'visual_diff')
+
+# Render scale: 0.5 = 36 DPI, enough to see any misplaced overlay
+ZOOM = 0.5
+
+# A pixel differs when any channel moves by more than this (absorbs anti-aliasing)
+PIXEL_THRESHOLD = 48
+
+# Fraction of differing pixels allowed outside the named regions
+DEFAULT_TOLERANCE = 0.002
+
+FIXTURES = [
+    {
+        'name': 'wg_abn_exclude_discount',
+        'pdf': 'WG_Invoice23432_DENLOU1-15_9_Dec_2025_1116_am.pdf',
+        'invoice_number': 'DENLOU1-15',
+        'invoice_date': '2025-12-09',
+        'customer_abn': '12 345 678 901',
+        'exclude_discount': True
+    },
+    {
+        'name': 'wg_no_abn_keep_discount',
+        'pdf': 'WG_Invoice23432_DENLOU1-15_9_Dec_2025_1116_am.pdf',
+        'invoice_number': '380812351',
+        'invoice_date': '2025-01-31',
+        'customer_abn': '',
+        'exclude_discount': False
+    },
+    {
+        'name': 'william_green_single_page',
+        'pdf': 'William Green_20251208_201237.pdf',
+        'invoice_number': 'WG-0001',
+        'invoice_date': '2025-12-08',
+        'customer_abn': '98 765 432 109',
+        'exclude_discount': True
+    },
+]
+
+# Tolerance regions in PDF points (top-left origin): (name, page, rect, allowed fraction).
+# Overlay areas get zero tolerance so a shifted label or value fails immediately.
+REGIONS = [
+    ('header fields', 0, (250, 70, 520, 110), 0.0),
+    ('invoice to label', 0, (14, 113, 80, 128), 0.0),
+    ('total paid cover', 1, (403, 325, 568, 335), 0.0),
+]
+
+# Areas that must render pure white: (name, page or None for all pages, rect builder, condition)
+BLANK_AREAS = [
+    ('header strip', None, lambda r: (0, 0, r.width, 15), lambda fixture: True),
+    ('footer strip', None, lambda r: (0, r.height - 30, r.width, r.height), lambda fixture: True),
+    ('total paid line', 1, lambda r: (403, 325, 568, 335), lambda fixture: fixture['exclude_discount']),
+]
+
+
+def expected_text_positions(fixture):
+    """(text, x, baseline y) for everything the overlay writes on page 1"""
+    formatted_date = SimplePDFProcessor()._format_date(fixture['invoice_date'])
+    positions = [
+        ('Invoice To:', 14, 126),
+        ('Invoice No', 300, 94),
+        (fixture['invoice_number'], 300, 104),
+        ('Invoice Date', 372, 94),
+        (formatted_date, 372, 104),
+    ]
+    if fixture['customer_abn']:
+        positions += [
+            ('Customer ABN', 445, 94),
+            (fixture['customer_abn'], 445, 104),
+        ]
+    return positions
+
+
+def render_pages(pdf_path):
+    """Render every page to an (height, width, 3) uint8 array"""
+    images = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            pix = page.get_pixmap(matrix=fitz.Matrix(ZOOM, ZOOM), colorspace=fitz.csRGB, alpha=False)
+            images.append(np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, 3))
+    return images
+
+
+def _to_pixels(rect, shape, inset=0):
+    """Convert a rect in points to clipped pixel slices, optionally shrunk by inset pixels per side"""
+    x0, y0, x1, y1 = (int(round(value * ZOOM)) for value in rect)
+    height, width = shape[:2]
+    return (slice(max(y0 + inset, 0), min(y1 - inset, height)),
+            slice(max(x0 + inset, 0), min(x1 - inset, width)))
+
+
+def tolerance_mask(page_number, shape):
+    """
+    Per-pixel region labels for a page: 0 is the default region and i + 1 is
+    REGIONS[i]. Returns (labels, allowed fraction per label).
+    """
+    labels = np.zeros(shape[:2], dtype=np.uint8)
+    allowed = [DEFAULT_TOLERANCE]
+    for index, (name, region_page, rect, tolerance) in enumerate(REGIONS):
+        allowed.append(tolerance)
+        if region_page == page_number:
+            labels[_to_pixels(rect, shape)] = index + 1
+    return labels, np.array(allowed)
+
+
+def compare_images(actual, golden, page_number):
+    """
+    Vectorised pixel diff with per-region tolerances.
+
+    Returns:
+        tuple: (list of failure messages, boolean mask of differing pixels)
+    """
+    if actual.shape != golden.shape:
+        return [f"size changed from {golden.shape[1]}x{golden.shape[0]} to {actual.shape[1]}x{actual.shape[0]}"], None
+
+    differs = (np.abs(actual.astype(np.int16) - golden.astype(np.int16)) > PIXEL_THRESHOLD).any(axis=2)
+    labels, allowed = tolerance_mask(page_number, actual.shape)
+
+    region_sizes = np.bincount(labels.ravel(), minlength=len(allowed))
+    region_diffs = np.bincount(labels.ravel(), weights=differs.ravel(), minlength=len(allowed))
+    fractions = np.divide(region_diffs, region_sizes, out=np.zeros_like(region_diffs), where=region_sizes > 0)
+
+    failures = []
+    names = ['rest of page'] + [region[0] for region in REGIONS]
+    for label in np.nonzero(fractions > allowed)[0]:
+        failures.append(f"{names[label]}: {fractions[label]:.2%} of pixels differ (allowed {allowed[label]:.2%})")
+    return failures, differs
+
+
+def check_blank_areas(pdf_path, images, fixture):
+    """Areas the overlay covers must be pure white (edge pixels are anti-aliased, so skipped)"""
+    failures = []
+    with fitz.open(pdf_path) as doc:
+        for name, area_page, rect_for, applies in BLANK_AREAS:
+            if not applies(fixture):
+                continue
+            pages = range(len(doc)) if area_page is None else [area_page]
+            for page_number in pages:
+                if page_number >= len(doc):
+                    continue
+                image = images[page_number]
+                area = image[_to_pixels(rect_for(doc[page_number].rect), image.shape, inset=1)]
+                if area.size and area.min() < 250:
+                    failures.append(f"page {page_number + 1}: {name} is not blank")
+    return failures
+
+
+def check_text_positions(pdf_path, fixture, tolerance=0.5):
+    """Every overlay text must start at its expected origin (x, baseline) on page 1"""
+    failures = []
+    with fitz.open(pdf_path) as doc:
+        spans = [
+            span
+            for block in doc[0].get_text('dict')['blocks']
+            for line in block.get('lines', [])
+            for span in line['spans']
+        ]
+    for text, x, baseline in expected_text_positions(fixture):
+        origins = [span['origin'] for span in spans if span['text'].strip() == text]
+        if not any(abs(ox - x) <= tolerance and abs(oy - baseline) <= tolerance for ox, oy in origins):
+            found = ', '.join(f"({ox:.1f}, {oy:.1f})" for ox, oy in origins) or 'nowhere'
+            failures.append(f"'{text}' expected at ({x}, {baseline}), found at {found}")
+    return failures
+
+
+def run(update=False):
+    """Process the fixture corpus and check (or regenerate) the golden images"""
+    started = time.perf_counter()
+    processor = SimplePDFProcessor()
+    os.makedirs(GOLDEN_FOLDER, exist_ok=True)
+    failed = 0
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for fixture in FIXTURES:
+            output_path = os.path.join(temp_dir, f"{fixture['name']}.pdf")
+            if not processor.process_invoice(
+                fixture['pdf'], fixture['invoice_number'], fixture['invoice_date'],
+                output_path, fixture['customer_abn'], fixture['exclude_discount']
+            ):
+                print(f"FAIL {fixture['name']}: processing failed")
+                failed += 1
+                continue
+
+            images = render_pages(output_path)
+            failures = check_text_positions(output_path, fixture) + check_blank_areas(output_path, images, fixture)
+
+            for page_number, image in enumerate(images):
+                golden_path = os.path.join(GOLDEN_FOLDER, f"{fixture['name']}_p{page_number + 1}.png")
+                if update:
+                    fitz.Pixmap(fitz.csRGB, image.shape[1], image.shape[0], image.tobytes(), False).save(golden_path)
+                    continue
+                if not os.path.exists(golden_path):
+                    failures.append(f"page {page_number + 1}: no golden image (run with --update)")
+                    continue
+
+                golden_pix = fitz.Pixmap(golden_path)
+                golden = np.frombuffer(golden_pix.samples, dtype=np.uint8).reshape(golden_pix.height, golden_pix.width, 3)
+                page_failures, differs = compare_images(image, golden, page_number)
+                if page_failures:
+                    failures += [f"page {page_number + 1}: {message}" for message in page_failures]
+                    if differs is not None:
+                        _save_diff(image, differs, f"{fixture['name']}_p{page_number + 1}")
+
+            if not update and len(images) != len([name for name in os.listdir(GOLDEN_FOLDER)
+                                                    if name.startswith(fixture['name'] + '_p')]):
+                failures.append("page count differs from golden images")
+
+            if failures:
+                failed += 1
+                print(f"FAIL {fixture['name']}")
+                for message in failures:
+                    print(f"    {message}")
+            else:
+                print(f"{'UPDATED' if update else 'PASS'} {fixture['name']} ({len(images)} pages)")
+
+    print(f"{len(FIXTURES) - failed}/{len(FIXTURES)} fixtures passed in {time.perf_counter() - started:.2f}s")
+    return failed == 0
+
+
+def _save_diff(image, differs, name):
+    """Write the rendered page with differing pixels highlighted in red"""
+    os.makedirs(DIFF_FOLDER, exist_ok=True)
+    highlighted = image.copy()
+    highlighted[differs] = (255, 0, 0)
+    path = os.path.join(DIFF_FOLDER, f"{name}_diff.png")
+    fitz.Pixmap(fitz.csRGB, highlighted.shape[1], highlighted.shape[0], highlighted.tobytes(), False).save(path)
+    print(f"    diff written to {path}")
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run(update='--update' in sys.argv) else 1)
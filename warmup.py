@@ -0,0 +1,141 @@
+"""
+Startup warm-up for the Invoice PDF Processor
+
+Runs one throwaway overlay and preview render against a tiny built-in PDF so
+the first real request after a deploy or worker recycle does not pay the
+PyMuPDF initialisation costs (library setup, font loading, pixmap rendering).
+
+Each worker also records its own cold start: when it was forked (gunicorn's
+post_fork hook) and how long its first request took.
+"""
+import os
+import threading
+import time
+import fitz  # PyMuPDF
+
+import config
+
+# Cold-start timings of this worker process (see mark_worker_forked and record_first_request)
+worker_start = {'pid': None, 'forked_at': None, 'first_request_ms': None, 'fork_to_first_response_ms': None}
+_worker_start_lock = threading.Lock()
+
+
+def build_warmup_pdf(output_pdf_path, page_count=2):
+    """
+    Write a tiny A4 PDF that resembles the real invoice layout closely enough
+    to exercise every overlay step (page 2 exists for the Total Paid cover).
+
+    Args:
+        output_pdf_path: Path to save the PDF
+        page_count: Number of pages to create
+    """
+    doc = fitz.open()
+    for page_num in range(page_count):
+        page = doc.new_page(width=595, height=842)
+        if page_num == 0:
+            page.insert_text((14, 126), "Customer:", fontsize=10)
+            page.insert_text((165, 94), "Ref", fontsize=9)
+            page.insert_text((165, 104), "WARMUP-1", fontsize=9)
+    doc.save(output_pdf_path)
+    doc.close()
+
+
+def warm_up(pdf_processor, text_extractor):
+    """
+    Warm up PDF processing in the current process.
+
+    Call this at import time of the server module so that, with gunicorn's
+    ``preload_app``, the warmed state is shared copy-on-write with every
+    forked worker.
+
+    Args:
+        pdf_processor: SimplePDFProcessor instance used by the server
+        text_extractor: PDFTextExtractor instance used by the server
+
+    Returns:
+        dict: {'success': bool, 'pid': int, 'timings_ms': dict, 'total_ms': float, 'error': str}
+    """
+    timings = {}
+    started = time.perf_counter()
+    input_path = os.path.join(config.TEMP_FOLDER, 'warmup_input.pdf')
+    output_path = os.path.join(config.TEMP_FOLDER, 'warmup_output.pdf')
+    preview_path = os.path.join(config.TEMP_FOLDER, 'warmup_preview.png')
+    error = None
+
+    try:
+        step = time.perf_counter()
+        build_warmup_pdf(input_path)
+        timings['build_sample'] = (time.perf_counter() - step) * 1000
+
+        step = time.perf_counter()
+        text_extractor.extract_reference_from_pdf(input_path)
+        timings['extract_reference'] = (time.perf_counter() - step) * 1000
+
+        step = time.perf_counter()
+        if not pdf_processor.process_invoice(input_path, 'WARMUP', '2000-01-01', output_path, 'WARMUP', True):
+            raise RuntimeError('Warm-up overlay failed')
+        timings['overlay'] = (time.perf_counter() - step) * 1000
+
+        step = time.perf_counter()
+        if not pdf_processor.generate_preview(output_path, preview_path):
+            raise RuntimeError('Warm-up preview failed')
+        timings['preview'] = (time.perf_counter() - step) * 1000
+
+    except Exception as e:
+        error = str(e)
+        print(f"Warm-up failed: {e}")
+
+    finally:
+        for path in (input_path, output_path, preview_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    return {
+        'success': error is None,
+        'pid': os.getpid(),
+        'timings_ms': {name: round(ms, 2) for name, ms in timings.items()},
+        'total_ms': round((time.perf_counter() - started) * 1000, 2),
+        'error': error
+    }
+
+
+def mark_worker_forked():
+    """Note when this worker was forked (call from gunicorn's post_fork hook)"""
+    with _worker_start_lock:
+        worker_start.update(pid=os.getpid(), forked_at=time.perf_counter(),
+                            first_request_ms=None, fork_to_first_response_ms=None)
+
+
+def record_first_request(request_started):
+    """
+    Record the latency of the first request this process serves.
+
+    Args:
+        request_started: time.perf_counter() value taken when the request arrived
+
+    Returns:
+        dict: A copy of worker_start the first time it is called in a process, None afterwards
+    """
+    pid = os.getpid()
+    if worker_start['pid'] == pid and worker_start['first_request_ms'] is not None:
+        return None
+    with _worker_start_lock:
+        if worker_start['pid'] == pid and worker_start['first_request_ms'] is not None:
+            return None
+        now = time.perf_counter()
+        if worker_start['pid'] != pid:
+            # Not forked through gunicorn (e.g. `python server.py`), so there is no fork time
+            worker_start.update(pid=pid, forked_at=None)
+        worker_start['first_request_ms'] = round((now - request_started) * 1000, 2)
+        if worker_start['forked_at'] is not None:
+            worker_start['fork_to_first_response_ms'] = round((now - worker_start['forked_at']) * 1000, 2)
+        return dict(worker_start)
+
+
+def format_report(report):
+    """Format a startup report as a single log line"""
+    steps = ', '.join(f"{name}={ms}ms" for name, ms in report.get('timings_ms', {}).items())
+    status = 'ok' if report.get('success') else f"failed ({report.get('error')})"
+    return f"Startup report (pid {report.get('pid')}): {status}; {steps}; total={report.get('total_ms')}ms"